@@ -2,39 +2,115 @@
 Batch processor for scraping multiple PriceCharting URLs from a CSV file.
 """
 
+import asyncio
 import csv
+import os
 import sys
+import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, TextIO, Tuple
+
 from tqdm import tqdm
 
-from pricecharting_scraper import PriceChartingScraper
+try:
+    import aiohttp
+except ImportError:  # Fall back to a thread pool over the requests session
+    aiohttp = None
+
+from pricecharting_scraper import (
+    PriceChartingScraper, DEFAULT_HEADERS, DEFAULT_POOL_MAXSIZE, RETRY_BACKOFF_FACTOR,
+    RETRY_STATUSES, RETRY_TOTAL, is_pricecharting_url
+)
+
+OUTPUT_FIELDNAMES = ['link', 'name', 'ungraded_price', 'psa10_price']
+
+# One output CSV row, in OUTPUT_FIELDNAMES order
+OutputRow = Tuple[str, str, Any, Any]
+
+# Number of rows written between flushes of the output file
+FLUSH_EVERY = 10
+
+
+class TokenBucket:
+    """Token-bucket rate limiter that allows short bursts up to a fixed capacity."""
+    
+    def __init__(self, capacity: float, rate: float):
+        """
+        Initialize the bucket full.
+        
+        Args:
+            capacity: Maximum number of requests that can be made in a burst
+            rate: Tokens refilled per second (sustained requests per second)
+        """
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """Take a token and return how many seconds to wait before it may be used."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            # A negative balance means the token was borrowed from the next refill
+            return max(0.0, -self.tokens / self.rate)
+    
+    def acquire(self) -> None:
+        """Block until a request may be made."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def acquire_async(self) -> None:
+        """Wait without blocking the event loop until a request may be made."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
 
 
 class BatchProcessor:
     """Batch processor for multiple PriceCharting URLs."""
     
-    def __init__(self, delay: float = 1.0, timeout: int = 10):
+    def __init__(self, delay: float = 1.0, timeout: int = 10, concurrency: int = 4,
+                 cache: bool = False):
         """
         Initialize the batch processor.
         
         Args:
-            delay: Delay between requests in seconds (be respectful to the server)
+            delay: Average delay between requests in seconds (be respectful to the server)
             timeout: Request timeout in seconds
+            concurrency: Maximum number of requests in flight at once
+            cache: Reuse pages cached on disk by earlier runs (requires requests-cache)
         """
-        self.scraper = PriceChartingScraper(timeout=timeout)
+        # Every worker needs its own pooled connection to avoid discarding them
+        self.scraper = PriceChartingScraper(timeout=timeout, cache=cache,
+                                            pool_maxsize=max(DEFAULT_POOL_MAXSIZE, concurrency))
         self.delay = delay
+        self.timeout = timeout
+        self.concurrency = concurrency
+        # Allow small bursts, then hold the sustained rate to one request per delay
+        self.limiter = TokenBucket(capacity=4, rate=1 / delay) if delay > 0 else None
         
-    def process_csv(self, input_file: str, output_file: str, url_column: str = 'url') -> Dict[str, int]:
+    def process_csv(self, input_file: str, output_file: str, url_column: str = 'url',
+                    resume: bool = False) -> Dict[str, int]:
         """
         Process a CSV file of URLs and output results to a new CSV file.
         
+        Rows are written to the output file as each URL completes, so an
+        interrupted run keeps everything scraped so far.
+        
         Args:
             input_file: Path to input CSV file containing URLs
             output_file: Path to output CSV file for results
             url_column: Name of the column containing URLs (default: 'url')
+            resume: Skip URLs already scraped successfully into output_file and
+                append to it; rows that failed are dropped and retried
             
         Returns:
             Dict with processing statistics
@@ -44,85 +120,256 @@ class BatchProcessor:
         
         if not urls:
             print(f"❌ No URLs found in {input_file}")
-            return {"total": 0, "success": 0, "failed": 0}
+            return {"total": 0, "success": 0, "failed": 0, "skipped": 0}
         
         print(f"📋 Found {len(urls)} URLs to process")
-        print(f"⏱️  Using {self.delay}s delay between requests")
         
-        # Process URLs
-        results = []
-        failed_count = 0
+        total_count = len(urls)
         
-        for i, url in enumerate(tqdm(urls, desc="Processing URLs")):
-            try:
-                # Scrape the URL
-                card_data = self.scraper.scrape_card(url)
-                
-                if card_data:
-                    results.append({
-                        'link': url,
-                        'name': card_data['card_name'],
-                        'ungraded_price': card_data['ungraded_price'] or '',
-                        'psa10_price': card_data['psa10_price'] or ''
-                    })
-                    tqdm.write(f"✅ {card_data['card_name']}: ${card_data['ungraded_price']} / ${card_data['psa10_price']}")
-                else:
-                    results.append({
-                        'link': url,
-                        'name': 'ERROR',
-                        'ungraded_price': '',
-                        'psa10_price': ''
-                    })
-                    failed_count += 1
-                    tqdm.write(f"❌ Failed to scrape: {url}")
-                
-            except Exception as e:
-                results.append({
-                    'link': url,
-                    'name': f'ERROR: {str(e)}',
-                    'ungraded_price': '',
-                    'psa10_price': ''
-                })
-                failed_count += 1
-                tqdm.write(f"❌ Error processing {url}: {e}")
-            
-            # Be respectful to the server
-            if i < len(urls) - 1:  # Don't delay after the last request
-                time.sleep(self.delay)
+        # Skip URLs finished by a previous, interrupted run
+        completed = self._prepare_resume(output_file) if resume else set()
+        skipped_count = 0
+        if completed:
+            urls = [url for url in urls if url not in completed]
+            skipped_count = total_count - len(urls)
+            print(f"⏭️  Resuming: skipping {skipped_count} URLs already in {output_file}")
         
-        # Write output CSV
-        self._write_output_csv(output_file, results)
+        failed_count = 0
+        if urls:
+            print(f"⏱️  Using {self.delay}s delay between requests")
+            print(f"⚡ Fetching up to {self.concurrency} URLs concurrently")
+            
+            try:
+                with open(output_file, 'a' if completed else 'w', newline='', encoding='utf-8') as file:
+                    writer = csv.writer(file)
+                    if not completed:
+                        writer.writerow(OUTPUT_FIELDNAMES)
+                    
+                    # Process URLs; the on-disk cache lives in the requests session,
+                    # so cached runs go through the thread pool instead of aiohttp
+                    if aiohttp is not None and not self.scraper.cache:
+                        failed_count = asyncio.run(self._run(urls, writer, file))
+                    else:
+                        failed_count = self._run_threaded(urls, writer, file)
+                    
+            except OSError as e:
+                print(f"❌ Error writing output file: {e}")
+                failed_count = len(urls)
         
         stats = {
-            "total": len(urls),
+            "total": total_count,
             "success": len(urls) - failed_count,
-            "failed": failed_count
+            "failed": failed_count,
+            "skipped": skipped_count
         }
         
         print(f"\n📊 Processing complete!")
         print(f"   Total URLs: {stats['total']}")
         print(f"   Successful: {stats['success']}")
         print(f"   Failed: {stats['failed']}")
+        if skipped_count:
+            print(f"   Skipped (already done): {stats['skipped']}")
         print(f"   Output saved to: {output_file}")
         
         return stats
     
+    async def _run(self, urls: List[str], writer: Any, file: TextIO) -> int:
+        """
+        Fetch and parse URLs concurrently, writing each row as it completes.
+        
+        Args:
+            urls: PriceCharting URLs to process
+            writer: csv.writer for the output file
+            file: The open output file, flushed periodically
+            
+        Returns:
+            Number of URLs that failed
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit_per_host=self.concurrency, ssl=False)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        written = 0
+        
+        async with aiohttp.ClientSession(headers=DEFAULT_HEADERS, connector=connector) as session:
+            with tqdm(total=len(urls), desc="Processing URLs") as progress:
+                
+                async def bounded_fetch(url: str) -> bool:
+                    nonlocal written
+                    # Reuse results scraped earlier in this process
+                    card_data = self.scraper.cached_result(url)
+                    if card_data:
+                        row, ok = self._build_row(url, card_data)
+                    else:
+                        async with semaphore:
+                            # Be respectful to the server
+                            if self.limiter:
+                                await self.limiter.acquire_async()
+                            row, ok = await self._fetch_row(session, url, timeout)
+                    
+                    # Tasks only interleave at awaits, so writes never overlap
+                    writer.writerow(row)
+                    written += 1
+                    if written % FLUSH_EVERY == 0:
+                        file.flush()
+                    
+                    progress.set_postfix_str(row[1][:40], refresh=False)
+                    progress.update(1)
+                    return ok
+                
+                outcomes = await asyncio.gather(*[bounded_fetch(url) for url in urls])
+        
+        return sum(1 for ok in outcomes if not ok)
+    
+    async def _get_html(self, session: "aiohttp.ClientSession", url: str,
+                        timeout: "aiohttp.ClientTimeout") -> bytes:
+        """
+        Download a page, retrying 429/5xx responses and connection errors with backoff.
+        
+        Mirrors the urllib3 retry policy of the scraper's requests session.
+        
+        Raises:
+            aiohttp.ClientError: If the request still fails after RETRY_TOTAL retries
+            asyncio.TimeoutError: If the final attempt times out
+        """
+        for attempt in range(RETRY_TOTAL):
+            delay = RETRY_BACKOFF_FACTOR * 2 ** attempt
+            try:
+                async with session.get(url, timeout=timeout) as response:
+                    if response.status not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        # Raw bytes: lxml sniffs the encoding faster than aiohttp's charset detection
+                        return await response.read()
+                    # Honour the server's Retry-After when it gives one in seconds
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                pass
+            
+            await asyncio.sleep(delay)
+        
+        # Last attempt: let any failure propagate
+        async with session.get(url, timeout=timeout) as response:
+            response.raise_for_status()
+            return await response.read()
+    
+    async def _fetch_row(self, session: "aiohttp.ClientSession", url: str,
+                         timeout: "aiohttp.ClientTimeout") -> Tuple[OutputRow, bool]:
+        """Fetch and parse a single URL, returning its output row and whether it succeeded."""
+        try:
+            html = await self._get_html(session, url, timeout)
+            # Parse off the event loop so BeautifulSoup doesn't stall other fetches
+            loop = asyncio.get_running_loop()
+            card_data = await loop.run_in_executor(None, self.scraper.parse, html, url)
+            return self._build_row(url, card_data)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"Request failed: {e}")
+            return self._build_row(url, None)
+        except Exception as e:
+            return self._build_row(url, None, error=e)
+    
+    def _run_threaded(self, urls: List[str], writer: Any, file: TextIO) -> int:
+        """
+        Fetch and parse URLs on a thread pool sharing the scraper's pooled session.
+        
+        Used when aiohttp is not installed. Rows are written from the calling
+        thread as each URL completes.
+        
+        Args:
+            urls: PriceCharting URLs to process
+            writer: csv.writer for the output file
+            file: The open output file, flushed periodically
+            
+        Returns:
+            Number of URLs that failed
+        """
+        failed_count = 0
+        
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            futures = {executor.submit(self._scrape_one, url): url for url in urls}
+            
+            with tqdm(total=len(urls), desc="Processing URLs") as progress:
+                for written, future in enumerate(as_completed(futures), start=1):
+                    url = futures[future]
+                    try:
+                        row, ok = self._build_row(url, future.result())
+                    except Exception as e:
+                        row, ok = self._build_row(url, None, error=e)
+                    
+                    if not ok:
+                        failed_count += 1
+                    writer.writerow(row)
+                    if written % FLUSH_EVERY == 0:
+                        file.flush()
+                    
+                    progress.set_postfix_str(row[1][:40], refresh=False)
+                    progress.update(1)
+        except BaseException:
+            # On Ctrl-C or an error, drop queued URLs instead of fetching rows that are never written
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        
+        executor.shutdown()
+        return failed_count
+    
+    def _scrape_one(self, url: str) -> Optional[Dict[str, Any]]:
+        """Scrape a single URL from a worker thread, honouring the shared rate limit."""
+        # Reuse results scraped earlier in this process
+        card_data = self.scraper.cached_result(url)
+        if card_data:
+            return card_data
+        
+        # Be respectful to the server; pages served from the disk cache never reach it
+        if self.limiter and not self.scraper.in_disk_cache(url):
+            self.limiter.acquire()
+        return self.scraper.scrape_card(url)
+    
+    def _build_row(self, url: str, card_data: Optional[Dict[str, Any]],
+                   error: Optional[Exception] = None) -> Tuple[OutputRow, bool]:
+        """Build the output row for a scraped URL and report the outcome."""
+        if card_data:
+            # Successes go to the log rather than redrawing the progress bar for every row
+            logging.info(f"✅ {card_data['card_name']}: ${card_data['ungraded_price']} / ${card_data['psa10_price']}")
+            return (
+                url,
+                card_data['card_name'],
+                card_data['ungraded_price'] or '',
+                card_data['psa10_price'] or ''
+            ), True
+        
+        if error is not None:
+            tqdm.write(f"❌ Error processing {url}: {error}")
+            name = f'ERROR: {str(error)}'
+        else:
+            tqdm.write(f"❌ Failed to scrape: {url}")
+            name = 'ERROR'
+        
+        return (url, name, '', ''), False
+    
     def _read_input_csv(self, input_file: str, url_column: str) -> List[str]:
         """Read URLs from input CSV file."""
         urls = []
         
         try:
             with open(input_file, 'r', newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
+                # Only one column is used, so skip building a dict per row
+                reader = csv.reader(file)
+                header = next(reader, [])
                 
-                if url_column not in reader.fieldnames:
-                    available_columns = ', '.join(reader.fieldnames or [])
+                if url_column not in header:
+                    available_columns = ', '.join(header)
                     raise ValueError(f"Column '{url_column}' not found. Available columns: {available_columns}")
                 
+                idx = header.index(url_column)
+                append = urls.append
+                
                 for row in reader:
-                    url = row[url_column].strip()
-                    if url and self._is_pricecharting_url(url):
-                        urls.append(url)
+                    if idx >= len(row):
+                        continue
+                    url = row[idx].strip()
+                    if url and is_pricecharting_url(url):
+                        append(url)
                     elif url:
                         print(f"⚠️  Skipping invalid URL: {url}")
                         
@@ -131,45 +378,75 @@ class BatchProcessor:
         except Exception as e:
             print(f"❌ Error reading input file: {e}")
             
-        return urls
+        # Drop duplicate URLs (common when combining sets), keeping input order
+        return list(dict.fromkeys(urls))
     
-    def _write_output_csv(self, output_file: str, results: List[Dict[str, Any]]) -> None:
-        """Write results to output CSV file."""
+    def _prepare_resume(self, output_file: str) -> Set[str]:
+        """
+        Read the links a previous run scraped successfully.
+        
+        Failed (ERROR) rows are removed from output_file so their URLs are
+        retried without leaving a second row behind.
+        
+        Args:
+            output_file: Path to the output CSV of the previous run
+            
+        Returns:
+            Set of links that don't need to be scraped again
+        """
         try:
-            with open(output_file, 'w', newline='', encoding='utf-8') as file:
-                fieldnames = ['link', 'name', 'ungraded_price', 'psa10_price']
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                
-                writer.writeheader()
-                writer.writerows(results)
-                
-        except Exception as e:
-            print(f"❌ Error writing output file: {e}")
-    
-    def _is_pricecharting_url(self, url: str) -> bool:
-        """Check if URL is a valid PriceCharting URL."""
-        return "pricecharting.com" in url.lower()
+            with open(output_file, 'r', newline='', encoding='utf-8') as file:
+                reader = csv.reader(file)
+                header = next(reader, [])
+                if 'link' not in header or 'name' not in header:
+                    return set()
+                link_idx = header.index('link')
+                name_idx = header.index('name')
+                rows = [row for row in reader if len(row) > max(link_idx, name_idx) and row[link_idx]]
+        except FileNotFoundError:
+            return set()
+        
+        kept = [row for row in rows if not row[name_idx].startswith('ERROR')]
+        if len(kept) < len(rows):
+            print(f"🔁 Retrying {len(rows) - len(kept)} URLs that failed last time")
+            # Rewrite via a temp file so an interruption can't lose the good rows
+            tmp_file = f"{output_file}.tmp"
+            with open(tmp_file, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(header)
+                writer.writerows(kept)
+            os.replace(tmp_file, output_file)
+        
+        return {row[link_idx] for row in kept}
 
 
 def main():
     """CLI for batch processing."""
-    if len(sys.argv) < 3:
-        print("Usage: python batch_processor.py <input_csv> <output_csv> [url_column] [delay]")
+    resume = '--resume' in sys.argv
+    cache = '--cache' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg not in ('--resume', '--cache')]
+    
+    if len(args) < 2:
+        print("Usage: python batch_processor.py <input_csv> <output_csv> [url_column] [delay] [concurrency] [--resume] [--cache]")
         print()
         print("Arguments:")
         print("  input_csv   - Path to CSV file containing URLs")
         print("  output_csv  - Path for output CSV file")
         print("  url_column  - Column name containing URLs (default: 'url')")
         print("  delay       - Delay between requests in seconds (default: 1.0)")
+        print("  concurrency - Maximum concurrent requests (default: 4)")
+        print("  --resume    - Skip URLs already in output_csv and append to it")
+        print("  --cache     - Cache downloaded pages on disk for an hour (requires requests-cache)")
         print()
         print("Example:")
-        print("  python batch_processor.py cards.csv results.csv url 1.5")
+        print("  python batch_processor.py cards.csv results.csv url 1.5 4")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
-    url_column = sys.argv[3] if len(sys.argv) > 3 else 'url'
-    delay = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0
+    input_file = args[0]
+    output_file = args[1]
+    url_column = args[2] if len(args) > 2 else 'url'
+    delay = float(args[3]) if len(args) > 3 else 1.0
+    concurrency = int(args[4]) if len(args) > 4 else 4
     
     # Validate input file exists
     if not Path(input_file).exists():
@@ -183,11 +460,14 @@ def main():
     )
     
     # Process the CSV file
-    processor = BatchProcessor(delay=delay)
-    stats = processor.process_csv(input_file, output_file, url_column)
+    processor = BatchProcessor(delay=delay, concurrency=concurrency, cache=cache)
+    try:
+        stats = processor.process_csv(input_file, output_file, url_column, resume=resume)
+    finally:
+        processor.scraper.close()
     
-    # Exit with error code if there were failures
-    if stats["failed"] > 0 and stats["success"] == 0:
+    # Exit with error code if nothing succeeded; rows kept from a resumed run count as done
+    if stats["failed"] > 0 and stats["success"] + stats["skipped"] == 0:
         sys.exit(1)
 
 
@@ -2,29 +2,178 @@
 PriceCharting scraper for extracting Pokemon card pricing information.
 """
 
+import atexit
 import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 import requests
 import urllib3
-from bs4 import BeautifulSoup
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from typing import Optional, Dict, Any, List, Tuple, Union
 import logging
 
+try:
+    import requests_cache
+except ImportError:  # Optional: only needed for PriceChartingScraper(cache=True)
+    requests_cache = None
+
 # Disable SSL warnings for scraping
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Patterns used for every price cell, compiled once
+_PRICE_RE = re.compile(r'\$[\d,]+\.?\d*')
+_NONNUM_RE = re.compile(r'[^\d.]')
+
+_PRICECHARTING_TOKEN = 'pricecharting.com'
+
+# Grades read from the pricing tables, lowercased once for matching
+_GRADES = ('Ungraded', 'PSA 10')
+_GRADE_NEEDLES = tuple(grade.lower() for grade in _GRADES)
+_GRADE_LENGTHS = frozenset(len(needle) for needle in _GRADE_NEEDLES)
+# Header cells shorter than this can't contain any grade, so they're never lowercased
+_MIN_HEADER_CELL_LEN = min(_GRADE_LENGTHS)
+
+# Only these tags are read, so the rest of the page (scripts, nav, ads) is never built
+_STRAINER = SoupStrainer(['h1', 'title', 'table', 'span'])
+
+# Connections kept per shared session unless a caller needs more
+DEFAULT_POOL_MAXSIZE = 32
+
+# Retry policy for transient failures, shared with the async batch client
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Headers shared by the requests session and the async batch client
+DEFAULT_HEADERS = {
+    # Set a user agent to avoid being blocked
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def is_pricecharting_url(url: str) -> bool:
+    """Check if URL is a valid PriceCharting URL."""
+    # Most URLs are already lowercase, so only lowercase when the fast check misses
+    return _PRICECHARTING_TOKEN in url or _PRICECHARTING_TOKEN in url.lower()
+
+
+# Successful scrape results by URL, shared by all scraper instances
+_RESULT_CACHE: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_RESULT_CACHE_SIZE = 4096
+_RESULT_CACHE_TTL = 3600  # seconds, prices move so don't keep them forever
+_RESULT_CACHE_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def _card_name_from_text(text: str) -> str:
+    """Strip the set suffix (e.g. "Pokemon Surging Sparks") from a heading."""
+    # Extract just the card name part (before "Pokemon")
+    if 'Pokemon' in text:
+        return text.split('Pokemon')[0].strip()
+    return text
+
 
 class PriceChartingScraper:
     """Scraper for PriceCharting.com to extract card pricing information."""
     
-    def __init__(self, timeout: int = 10):
-        """Initialize the scraper with optional timeout."""
+    # Pooled sessions shared by every instance, keyed by (disk cache on, pool size)
+    _sessions: Dict[Tuple[bool, int], requests.Session] = {}
+    _sessions_lock = threading.Lock()
+    
+    def __init__(self, timeout: int = 10, cache: bool = False,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE):
+        """
+        Initialize the scraper with optional timeout.
+        
+        Args:
+            timeout: Request timeout in seconds
+            cache: Keep downloaded pages in an on-disk cache for an hour
+                (requires requests-cache); handy for repeated dev runs
+            pool_maxsize: Connections to keep open, at least the number of
+                threads sharing the scraper
+        """
         self.timeout = timeout
-        self.session = requests.Session()
-        # Set a user agent to avoid being blocked
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        if cache and requests_cache is None:
+            logging.warning("requests-cache is not installed, continuing without the HTTP cache")
+        self.cache = cache and requests_cache is not None
+        self.pool_maxsize = pool_maxsize
+        
+    @property
+    def session(self) -> requests.Session:
+        """The process-wide pooled session used by this scraper."""
+        return self._get_session(self.cache, self.pool_maxsize)
+        
+    @classmethod
+    def _get_session(cls, cache: bool, pool_maxsize: int) -> requests.Session:
+        """Return the shared session, creating it on first use."""
+        key = (cache, pool_maxsize)
+        with cls._sessions_lock:
+            session = cls._sessions.get(key)
+            if session is None:
+                session = cls._build_session(cache, pool_maxsize)
+                cls._sessions[key] = session
+            return session
+        
+    @staticmethod
+    def _build_session(cache: bool, pool_maxsize: int) -> requests.Session:
+        """Create a session with pooled keep-alive connections."""
+        if cache:
+            session = requests_cache.CachedSession(
+                'pricecharting_cache',
+                backend='sqlite',
+                expire_after=3600,
+                allowable_codes=(200,)
+            )
+        else:
+            session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.headers.update({
+            # gzip/deflate, plus br/zstd when urllib3 can decode them
+            'Accept-Encoding': ACCEPT_ENCODING,
+            'Connection': 'keep-alive'
         })
         
+        # Reuse pooled keep-alive connections to pricecharting.com and retry transient failures
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=urllib3.Retry(
+                total=RETRY_TOTAL,
+                backoff_factor=RETRY_BACKOFF_FACTOR,
+                status_forcelist=list(RETRY_STATUSES)
+            )
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+        
+    def close(self) -> None:
+        """
+        Close the process-wide session this scraper uses and release its pooled connections.
+        
+        The session is shared by every scraper in the process with the same
+        cache and pool settings (e.g. a TCGPriceAPI alongside a batch run), so
+        this closes it for all of them, not just this instance. Scrapers used
+        afterwards transparently open a new session.
+        """
+        with self._sessions_lock:
+            session = self._sessions.pop((self.cache, self.pool_maxsize), None)
+        if session is not None:
+            session.close()
+        
+    @classmethod
+    def close_all(cls) -> None:
+        """Close every shared session; registered to run at interpreter exit."""
+        with cls._sessions_lock:
+            sessions = list(cls._sessions.values())
+            cls._sessions.clear()
+        for session in sessions:
+            session.close()
+        
     def scrape_card(self, url: str) -> Optional[Dict[str, Any]]:
         """
         Scrape a PriceCharting URL and extract card information.
@@ -35,27 +184,13 @@ class PriceChartingScraper:
         Returns:
             Dict containing card_name, ungraded_price, and psa10_price, or None if failed
         """
+        cached = self.cached_result(url)
+        if cached:
+            return cached
+        
         try:
-            response = self.session.get(url, timeout=self.timeout, verify=False)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract card name from the page title or h1
-            card_name = self._extract_card_name(soup)
-            ungraded_price = self._extract_ungraded_price(soup)
-            psa10_price = self._extract_psa10_price(soup)
-            
-            if not card_name:
-                logging.warning("Could not extract card name from the page")
-                return None
-                
-            return {
-                'card_name': card_name,
-                'ungraded_price': ungraded_price,
-                'psa10_price': psa10_price,
-                'url': url
-            }
+            html = self.fetch(url)
+            return self.parse(html, url)
             
         except requests.RequestException as e:
             logging.error(f"Request failed: {e}")
@@ -64,90 +199,258 @@ class PriceChartingScraper:
             logging.error(f"Unexpected error while scraping: {e}")
             return None
     
+    def cached_result(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a recent successful result for a URL without fetching it.
+        
+        Args:
+            url: The PriceCharting URL for the card
+            
+        Returns:
+            Copy of the cached result dict, or None if not cached or expired
+        """
+        with _RESULT_CACHE_LOCK:
+            entry = _RESULT_CACHE.get(url)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > _RESULT_CACHE_TTL:
+                del _RESULT_CACHE[url]
+                return None
+            _RESULT_CACHE.move_to_end(url)
+            return dict(result)
+    
+    def _cache_result(self, url: str, result: Dict[str, Any]) -> None:
+        """Remember a successful result, evicting the least recently used."""
+        with _RESULT_CACHE_LOCK:
+            _RESULT_CACHE[url] = (time.monotonic(), dict(result))
+            _RESULT_CACHE.move_to_end(url)
+            if len(_RESULT_CACHE) > _RESULT_CACHE_SIZE:
+                _RESULT_CACHE.popitem(last=False)
+    
+    def in_disk_cache(self, url: str) -> bool:
+        """
+        Check whether fetch() would be answered from the on-disk cache.
+        
+        Args:
+            url: The PriceCharting URL for the card
+            
+        Returns:
+            True if the cache is enabled and holds an unexpired response for url
+        """
+        if not self.cache:
+            return False
+        cache = self.session.cache
+        # fetch() sends verify=False, which is part of the cache key
+        key = cache.create_key(requests.Request('GET', url), verify=False)
+        response = cache.get_response(key)
+        return response is not None and not response.is_expired
+    
+    def fetch(self, url: str) -> bytes:
+        """
+        Download the raw HTML for a PriceCharting URL.
+        
+        Args:
+            url: The PriceCharting URL for the card
+            
+        Returns:
+            Response body as bytes
+            
+        Raises:
+            requests.RequestException: If the request fails
+        """
+        response = self.session.get(url, timeout=self.timeout, verify=False)
+        response.raise_for_status()
+        return response.content
+    
+    def parse(self, html: Union[str, bytes], url: str) -> Optional[Dict[str, Any]]:
+        """
+        Extract card information from a downloaded PriceCharting page.
+        
+        Args:
+            html: Page HTML as returned by fetch(); pass raw bytes so lxml
+                can detect the encoding itself
+            url: The URL the page was fetched from
+            
+        Returns:
+            Dict containing card_name, ungraded_price, and psa10_price, or None if failed
+        """
+        soup = BeautifulSoup(html, 'lxml', parse_only=_STRAINER)
+        
+        # Extract card name from the page title or h1
+        card_name = self._extract_card_name(soup)
+        ungraded_price, psa10_price = self._extract_prices(soup, html)
+        
+        if not card_name:
+            logging.warning("Could not extract card name from the page")
+            return None
+            
+        result = {
+            'card_name': card_name,
+            'ungraded_price': ungraded_price,
+            'psa10_price': psa10_price,
+            'url': url
+        }
+        self._cache_result(url, result)
+        return result
+    
     def _extract_card_name(self, soup: BeautifulSoup) -> Optional[str]:
         """Extract the card name from the page."""
-        # Try to find the card name in the h1 tag
+        # Try to find the card name in the h1 tag. It is checked before <title>
+        # on purpose: titles carry a " Prices" suffix that the h1 lacks (compare
+        # the names in sample_output.csv), and with the SoupStrainer in parse()
+        # the h1 lookup only scans the handful of retained tags anyway.
         h1_tag = soup.find('h1')
         if h1_tag:
             # Clean up the text - remove "Pokemon Surging Sparks" part
-            card_text = h1_tag.get_text(strip=True)
-            # Extract just the card name part (before "Pokemon")
-            if 'Pokemon' in card_text:
-                card_name = card_text.split('Pokemon')[0].strip()
-                return card_name
-            return card_text
+            return _card_name_from_text(h1_tag.get_text(strip=True))
             
         # Fallback: try to extract from title tag
         title_tag = soup.find('title')
         if title_tag:
-            title_text = title_tag.get_text(strip=True)
             # Similar cleanup for title
-            if 'Pokemon' in title_text:
-                card_name = title_text.split('Pokemon')[0].strip()
-                return card_name
-            return title_text
+            return _card_name_from_text(title_tag.get_text(strip=True))
             
         return None
     
-    def _extract_ungraded_price(self, soup: BeautifulSoup) -> Optional[float]:
-        """Extract the ungraded price from the pricing table."""
-        return self._extract_price_by_grade(soup, 'Ungraded')
-    
-    def _extract_psa10_price(self, soup: BeautifulSoup) -> Optional[float]:
-        """Extract the PSA 10 price from the pricing table."""
-        return self._extract_price_by_grade(soup, 'PSA 10')
-    
-    def _extract_price_by_grade(self, soup: BeautifulSoup, grade_name: str) -> Optional[float]:
+    def _extract_prices(self, soup: BeautifulSoup,
+                        html: Optional[Union[str, bytes]] = None) -> Tuple[Optional[float], Optional[float]]:
         """
-        Extract price for a specific grade from the pricing table.
+        Extract the ungraded and PSA 10 prices in a single pass over the tables.
         
         Args:
-            soup: BeautifulSoup object of the page
-            grade_name: Grade to search for (e.g., 'Ungraded', 'PSA 10')
+            soup: BeautifulSoup object of the page, possibly built with _STRAINER
+            html: Raw page HTML, re-parsed in full if the PSA 10 span fallback is needed
             
         Returns:
-            Price as float or None if not found
+            Tuple of (ungraded_price, psa10_price), each a float or None if not found
         """
-        # Strategy 1: Look for the main comparison table (first table with grade headers)
-        tables = soup.find_all('table')
+        # Matches from the comparison table win over the price guide table,
+        # which in turn wins over the price span fallback
+        comparison_prices: Dict[str, float] = {}
+        guide_prices: Dict[str, Optional[float]] = {}
         
-        for table in tables:
+        for table in soup.find_all('table'):
             rows = table.find_all('tr')
+            
+            # Strategy 1: Look for the main comparison table (first table with grade headers)
             if len(rows) >= 2:
-                # Check if this is the main pricing table by looking for grade headers
-                header_row = rows[0]
-                price_row = rows[1] if len(rows) > 1 else None
+                header_cells = rows[0].find_all(['td', 'th'])
+                price_cells = rows[1].find_all(['td', 'th'])
+                header_texts = []
+                for cell in header_cells:
+                    cell_text = cell.get_text(strip=True)
+                    # Keep a placeholder for skipped cells so column indexes still line up
+                    if len(cell_text) >= _MIN_HEADER_CELL_LEN:
+                        header_texts.append(cell_text.lower())
+                    else:
+                        header_texts.append('')
                 
-                header_cells = header_row.find_all(['td', 'th'])
-                price_cells = price_row.find_all(['td', 'th']) if price_row else []
+                for grade, needle in zip(_GRADES, _GRADE_NEEDLES):
+                    if grade not in comparison_prices:
+                        price = self._price_from_comparison_row(header_texts, price_cells, needle)
+                        if price is not None:
+                            comparison_prices[grade] = price
                 
-                # Look for the grade in header cells
-                for i, cell in enumerate(header_cells):
-                    cell_text = cell.get_text(strip=True)
-                    if grade_name.lower() in cell_text.lower():
-                        # Found the grade column, get corresponding price
-                        if i < len(price_cells):
-                            price_text = price_cells[i].get_text(strip=True)
-                            # Extract just the dollar amount, ignore +/- changes
-                            price_match = re.search(r'\$[\d,]+\.?\d*', price_text)
-                            if price_match:
-                                return self._parse_price(price_match.group())
-        
-        # Strategy 2: Look for the full price guide table (simple two-column format)
-        for table in tables:
-            rows = table.find_all('tr')
+                # Nothing later in the page can override the comparison table
+                if len(comparison_prices) == len(_GRADES):
+                    break
+            
+            # Strategy 2: Look for the full price guide table (simple two-column format)
             for row in rows:
-                cells = row.find_all(['td', 'th'])
+                # Only the grade and price cells matter, skip building the rest
+                cells = row.find_all(['td', 'th'], limit=2)
                 if len(cells) >= 2:
                     grade_cell = cells[0].get_text(strip=True)
-                    price_cell = cells[1].get_text(strip=True)
-                    
-                    if grade_name.lower() == grade_cell.lower():
-                        return self._parse_price(price_cell)
+                    # Only an exact-length cell can equal a grade, skip lowercasing the rest
+                    if len(grade_cell) not in _GRADE_LENGTHS:
+                        continue
+                    grade_cell = grade_cell.lower()
+                    for grade, needle in zip(_GRADES, _GRADE_NEEDLES):
+                        if grade not in guide_prices and needle == grade_cell:
+                            guide_prices[grade] = self._parse_price(cells[1].get_text(strip=True))
+        
+        prices = []
+        price_spans = None
+        for grade in _GRADES:
+            if grade in comparison_prices:
+                prices.append(comparison_prices[grade])
+            elif grade in guide_prices:
+                prices.append(guide_prices[grade])
+            else:
+                # Strategy 3: Look for price spans with class 'price js-price'
+                if price_spans is None:
+                    price_spans = soup.find_all('span', class_=['price', 'js-price'])
+                if grade == 'PSA 10' and html is not None and self._needs_full_page(soup, price_spans, html):
+                    # This lookup reads each span's parent, which the strainer dropped
+                    # for some spans, so rebuild the full page to read them
+                    full_soup = BeautifulSoup(html, 'lxml')
+                    full_spans = full_soup.find_all('span', class_=['price', 'js-price'])
+                    prices.append(self._price_from_spans(full_spans, grade))
+                else:
+                    prices.append(self._price_from_spans(price_spans, grade))
+        
+        return prices[0], prices[1]
+    
+    def _price_from_comparison_row(self, header_texts: List[str], price_cells: List[Tag],
+                                   grade_needle: str) -> Optional[float]:
+        """
+        Read the price under a grade's column in the main comparison table.
+        
+        Args:
+            header_texts: Lowercased text of each header cell ('' for skipped cells)
+            price_cells: Cells of the row below the header
+            grade_needle: Lowercased grade to search for (e.g., 'ungraded', 'psa 10')
+            
+        Returns:
+            Price as float or None if not found
+        """
+        # Look for the grade in header cells
+        for i, cell_text in enumerate(header_texts):
+            if grade_needle in cell_text:
+                # Found the grade column, get corresponding price
+                if i < len(price_cells):
+                    price_text = price_cells[i].get_text(strip=True)
+                    # Extract just the dollar amount, ignore +/- changes
+                    price_match = _PRICE_RE.search(price_text)
+                    if price_match:
+                        return self._parse_price(price_match.group())
+        return None
+    
+    def _needs_full_page(self, soup: BeautifulSoup, price_spans: List[Tag],
+                         html: Union[str, bytes]) -> bool:
+        """
+        Check whether the PSA 10 span fallback needs the unstrained page.
         
-        # Strategy 3: Look for price spans with class 'price js-price'
-        price_spans = soup.find_all('span', class_=['price', 'js-price'])
+        Spans inside a retained tag keep their real parent and are checked
+        on the strained tree. A span whose parent was strained out can only
+        match if "psa" occurs somewhere the strainer dropped, which is
+        detected by counting it in the raw HTML against the retained text.
+        
+        Args:
+            soup: BeautifulSoup object built with _STRAINER
+            price_spans: Price spans found in soup
+            html: Raw page HTML
+            
+        Returns:
+            True if the page must be parsed again without the strainer
+        """
+        if not any(isinstance(span.parent, BeautifulSoup) for span in price_spans):
+            return False
+        needle = b'psa' if isinstance(html, bytes) else 'psa'
+        return html.lower().count(needle) > soup.get_text().lower().count('psa')
+    
+    def _price_from_spans(self, price_spans: List[Tag], grade_name: str) -> Optional[float]:
+        """
+        Fallback: pick a grade's price out of the page's price spans.
         
+        Args:
+            price_spans: All <span class="price js-price"> tags on the page
+            grade_name: Grade to search for (e.g., 'Ungraded', 'PSA 10')
+            
+        Returns:
+            Price as float or None if not found
+        """
         # For the main comparison table, we need to find the right position
         if grade_name == 'Ungraded':
             # The first price span should be ungraded
@@ -157,7 +460,11 @@ class PriceChartingScraper:
             # PSA 10 is typically the 6th price in the main table (0-indexed: 5)
             # Or we can search more systematically
             for span in price_spans:
-                # Look for nearby text that mentions PSA 10
+                # Look for nearby text that mentions PSA 10; spans whose parent was
+                # strained out hang off the document root, and _needs_full_page()
+                # has already ruled out a match for them
+                if isinstance(span.parent, BeautifulSoup):
+                    continue
                 parent_text = span.parent.get_text() if span.parent else ""
                 if 'psa' in parent_text.lower() and '10' in parent_text:
                     return self._parse_price(span.get_text(strip=True))
@@ -174,11 +481,24 @@ class PriceChartingScraper:
         Returns:
             Price as float or None if parsing fails
         """
-        if not price_text or price_text.strip() == '-':
+        if not price_text:
             return None
+        
+        # Fast path for the usual clean format, e.g. '$1,234.56'
+        text = price_text.strip()
+        if text == '-':
+            return None
+        if text[:1] == '$':
+            text = text[1:]
+        if ',' in text:
+            text = text.replace(',', '')
+        # Plain digits with at most one '.', so float() can't accept exponents,
+        # underscores or other forms the cleanup below would read differently
+        if text.replace('.', '', 1).isdigit() and text.isascii():
+            return float(text)
             
         # Remove currency symbols, commas, and extra whitespace
-        clean_price = re.sub(r'[^\d.]', '', price_text.replace(',', ''))
+        clean_price = _NONNUM_RE.sub('', price_text.replace(',', ''))
         
         try:
             return float(clean_price)
@@ -187,6 +507,9 @@ class PriceChartingScraper:
             return None
 
 
+atexit.register(PriceChartingScraper.close_all)
+
+
 def main():
     """Simple CLI for testing the scraper."""
     import sys
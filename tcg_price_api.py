@@ -2,10 +2,10 @@
 TCG Price API - A service for extracting trading card pricing information.
 """
 
-from pricecharting_scraper import PriceChartingScraper
+from pricecharting_scraper import PriceChartingScraper, is_pricecharting_url
 from typing import Optional, Dict, Any
 import logging
-import json
+import orjson
 
 
 class TCGPriceAPI:
@@ -41,13 +41,13 @@ class TCGPriceAPI:
         result = self.get_card_prices(url)
         
         if result:
-            return json.dumps(result, indent=2)
+            return orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
         else:
-            return json.dumps({"error": "Failed to scrape URL", "url": url}, indent=2)
+            return orjson.dumps({"error": "Failed to scrape URL", "url": url}, option=orjson.OPT_INDENT_2).decode()
     
     def is_pricecharting_url(self, url: str) -> bool:
         """Check if the URL is a valid PriceCharting URL."""
-        return "pricecharting.com" in url.lower()
+        return is_pricecharting_url(url)
 
 
 def main():
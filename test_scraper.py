@@ -12,7 +12,8 @@ def test_url():
     # Enable debug logging
     logging.basicConfig(level=logging.DEBUG)
     
-    scraper = PriceChartingScraper()
+    # Cache the page on disk so repeated debugging runs only re-parse it
+    scraper = PriceChartingScraper(cache=True)
     result = scraper.scrape_card(url)
     
     print("=== Scraping Results ===")